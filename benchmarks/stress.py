@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Concurrency stress harness for MedleyContainer.
+
+Hammers a single container from N threads or N asyncio tasks with a mix of
+cold singleton resolution, factory calls, extend(), match() and writes, then
+reports throughput, latency percentiles, duplicate singleton constructions
+and, when the container guards construction with per-identifier locks, how
+often those locks were contended.
+
+Only the standard library is required (Python 3.7+):
+
+    python -m benchmarks.stress --mode threads --workers 8
+    python -m benchmarks.stress --mode asyncio --workers 64 --json
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+import threading
+import time
+
+from medley import MedleyContainer
+
+OPERATIONS = ('singleton', 'factory', 'extend', 'match', 'write')
+DEFAULT_MIX = 'singleton=50,factory=25,extend=5,match=5,write=15'
+
+
+class LockStats(object):
+
+    def __init__(self):
+        # workers update these concurrently, a private lock keeps the counts exact
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+
+    def record(self, contended=False, wait_time=0.0):
+        with self._lock:
+            self.acquisitions += 1
+
+            if contended:
+                self.contended += 1
+                self.wait_time += wait_time
+
+
+class InstrumentedLock(object):
+
+    def __init__(self, lock, stats):
+        self._lock = lock
+        self.stats = stats
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.stats.record()
+            return True
+
+        if not blocking:
+            self.stats.record()
+            return False
+
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        self.stats.record(True, time.perf_counter() - start)
+
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Workload(object):
+
+    def __init__(self, options):
+        self.options = options
+        self.container = MedleyContainer()
+        self.builds = collections.Counter()
+        self._builds_lock = threading.Lock()
+        self.lock = None
+
+        # shadowing the lock factory on the instance is the only way to observe contention without touching medley
+        singleton_lock = getattr(self.container, '_singleton_lock', None)
+
+        if singleton_lock is not None:
+            stats = self.lock = LockStats()
+            self.container._singleton_lock = lambda id: InstrumentedLock(singleton_lock(id), stats)
+
+        for index in range(options.singletons):
+            self.container['singleton.{}'.format(index)] = self._singleton(index)
+
+        for index in range(options.factories):
+            self.container['factory.{}'.format(index)] = self.container.factory(self._factory(index))
+
+    def _build(self):
+        # a short, GIL-releasing pause widens the window in which two workers build the same singleton
+        if self.options.build_delay:
+            time.sleep(self.options.build_delay)
+
+    def _singleton(self, index):
+        def definition(c):
+            with self._builds_lock:
+                self.builds[index] += 1
+
+            self._build()
+            return {'index': index}
+        return definition
+
+    def _factory(self, index):
+        def definition(c):
+            # match() collects services into a set, so factory products must be hashable
+            return (index, id(c['singleton.{}'.format(index % self.options.singletons)]))
+        return definition
+
+    def run_operation(self, name, rng, worker, sequence):
+        c = self.container
+
+        if name == 'singleton':
+            c['singleton.{}'.format(rng.randrange(self.options.singletons))]
+        elif name == 'factory':
+            c['factory.{}'.format(rng.randrange(self.options.factories))]
+        elif name == 'extend':
+            key = 'extended.{}.{}'.format(worker, sequence)
+            c[key] = lambda c: []
+            c.extend(key, lambda value, c: value + [1])
+            c[key]
+            del c[key]
+        elif name == 'match':
+            c.match(r'factory\.{}'.format(rng.randrange(10)))
+        elif name == 'write':
+            key = 'write.{}'.format(rng.randrange(self.options.write_keys))
+            if rng.random() < 0.5:
+                c[key] = sequence
+            else:
+                del c[key]
+
+    def duplicates(self):
+        return sum(count - 1 for count in self.builds.values() if count > 1)
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    def merge(self, other):
+        for name, values in other.latencies.items():
+            self.latencies[name].extend(values)
+
+        self.errors.update(other.errors)
+
+
+def parse_mix(value):
+    weights = {}
+
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError('Unknown operation "{}".'.format(name))
+
+        weights[name] = float(weight)
+
+    return weights
+
+
+def operation_schedule(options, worker):
+    rng = random.Random(options.seed + worker)
+    names = sorted(options.mix)
+    weights = [options.mix[name] for name in names]
+
+    return rng, [rng.choices(names, weights)[0] for _ in range(options.iterations)]
+
+
+def timed(workload, recorder, name, rng, worker, sequence):
+    start = time.perf_counter()
+
+    try:
+        workload.run_operation(name, rng, worker, sequence)
+    except Exception as e:
+        recorder.errors['{}: {}'.format(name, type(e).__name__)] += 1
+    finally:
+        recorder.latencies[name].append(time.perf_counter() - start)
+
+
+def run_threads(workload, options):
+    recorders = [Recorder() for _ in range(options.workers)]
+    barrier = threading.Barrier(options.workers)
+
+    def worker(index):
+        rng, schedule = operation_schedule(options, index)
+        barrier.wait()
+
+        for sequence, name in enumerate(schedule):
+            timed(workload, recorders[index], name, rng, index, sequence)
+
+    threads = [threading.Thread(target=worker, args=(index, )) for index in range(options.workers)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return recorders
+
+
+def run_asyncio(workload, options):
+    recorders = [Recorder() for _ in range(options.workers)]
+
+    async def worker(index):
+        rng, schedule = operation_schedule(options, index)
+
+        for sequence, name in enumerate(schedule):
+            timed(workload, recorders[index], name, rng, index, sequence)
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*[worker(index) for index in range(options.workers)])
+
+    asyncio.run(main())
+    return recorders
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(workload, recorder, elapsed, options):
+    operations = {}
+
+    for name in sorted(recorder.latencies):
+        ordered = sorted(recorder.latencies[name])
+        operations[name] = {
+            'count': len(ordered),
+            'p50_us': percentile(ordered, 0.50) * 1e6,
+            'p90_us': percentile(ordered, 0.90) * 1e6,
+            'p99_us': percentile(ordered, 0.99) * 1e6,
+            'max_us': ordered[-1] * 1e6
+        }
+
+    total = sum(operation['count'] for operation in operations.values())
+    lock = workload.lock
+
+    return {
+        'mode': options.mode,
+        'workers': options.workers,
+        'operations_total': total,
+        'elapsed_s': elapsed,
+        'throughput_ops_s': total / elapsed if elapsed else 0.0,
+        'operations': operations,
+        'errors': dict(recorder.errors),
+        'singleton_builds': sum(workload.builds.values()),
+        'duplicate_constructions': workload.duplicates(),
+        'lock': None if lock is None else {
+            'acquisitions': lock.acquisitions,
+            'contended': lock.contended,
+            'wait_s': lock.wait_time
+        }
+    }
+
+
+def print_report(report, out=sys.stdout):
+    out.write('{mode}: {workers} workers, {operations_total} ops in {elapsed_s:.3f}s '
+              '({throughput_ops_s:,.0f} ops/s)\n'.format(**report))
+    out.write('{:<10} {:>9} {:>10} {:>10} {:>10} {:>10}\n'.format('operation', 'count', 'p50 us', 'p90 us', 'p99 us', 'max us'))
+
+    for name, operation in report['operations'].items():
+        out.write('{:<10} {count:>9} {p50_us:>10.1f} {p90_us:>10.1f} {p99_us:>10.1f} {max_us:>10.1f}\n'.format(name, **operation))
+
+    out.write('singleton builds: {singleton_builds}, duplicate constructions: {duplicate_constructions}\n'.format(**report))
+
+    if report['lock'] is None:
+        out.write('lock contention: n/a (container has no per-identifier build locks)\n')
+    else:
+        out.write('lock contention: {contended}/{acquisitions} acquisitions, {wait_s:.6f}s waiting\n'.format(**report['lock']))
+
+    for error, count in sorted(report['errors'].items()):
+        out.write('error {}: {}\n'.format(error, count))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Stress a MedleyContainer from concurrent workers.')
+    parser.add_argument('--mode', choices=('threads', 'asyncio'), default='threads')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=10000, help='operations per worker')
+    parser.add_argument('--singletons', type=int, default=1000, help='cold singletons defined up front')
+    parser.add_argument('--factories', type=int, default=100)
+    parser.add_argument('--write-keys', type=int, default=100)
+    parser.add_argument('--build-delay', type=float, default=0.0, help='seconds each singleton build sleeps')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--switch-interval', type=float, default=None, help='sys.setswitchinterval() for thread mode')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+
+    if options.switch_interval is not None:
+        sys.setswitchinterval(options.switch_interval)
+
+    workload = Workload(options)
+    runner = run_threads if options.mode == 'threads' else run_asyncio
+
+    start = time.perf_counter()
+    recorders = runner(workload, options)
+    elapsed = time.perf_counter() - start
+
+    recorder = Recorder()
+    for other in recorders:
+        recorder.merge(other)
+
+    report = summarize(workload, recorder, elapsed, options)
+
+    if options.json:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        print_report(report)
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 from .container import MedleyContainer
-from .errors import FrozenServiceError, UnknownIdentifierError
+from .errors import (AmbiguousIdentifierError, CircularDependencyError, FrozenServiceError, ResolutionError, ScopeError,
+                     UnknownIdentifierError)
+from .generations import GenerationalContainer
 from .service_provider import ServiceProviderInterface
 
-__all__ = ('MedleyContainer', 'ServiceProviderInterface', 'FrozenServiceError', 'UnknownIdentifierError')
+__all__ = ('MedleyContainer', 'GenerationalContainer', 'ServiceProviderInterface', 'AmbiguousIdentifierError', 'CircularDependencyError',
+           'FrozenServiceError', 'ResolutionError', 'ScopeError', 'UnknownIdentifierError')
 name = 'medley'
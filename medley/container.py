@@ -1,11 +1,119 @@
+import atexit
+import errno
+import functools
+import itertools
 import re
-from .errors import FrozenServiceError, UnknownIdentifierError
+import threading
+from bisect import bisect_left, insort
+import six
+from .errors import AmbiguousIdentifierError, FrozenServiceError, ScopeError, UnknownIdentifierError
+from .mapped import MappedFile, check_format
+from .profile import AccessProfile
+from .resolution import resolve
 
 try:
     from collections.abc import Hashable
 except ImportError:
     from collections import Hashable
 
+try:
+    import contextvars
+    from .scope import Scope
+except ImportError:
+    contextvars = None
+
+_MAX_CACHED_PATTERNS = 512
+_pattern_cache = {}
+
+
+def _literal_prefix(pattern):
+    prefix = []
+    literal = True
+    depth = 0
+    in_class = False
+    index = 1 if pattern.startswith('^') else 0
+
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+
+        if char == '\\':
+            escaped = pattern[index:index + 1]
+            index += 1
+
+            if literal and not in_class and escaped and not escaped.isalnum():
+                prefix.append(escaped)
+            else:
+                literal = False
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            literal = False
+            in_class = True
+
+            # a leading "]" (after an optional "^") is a literal member of the class
+            if pattern[index:index + 1] == '^':
+                index += 1
+            if pattern[index:index + 1] == ']':
+                index += 1
+        elif char == '(':
+            literal = False
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|':
+            if depth == 0:
+                return ''
+            literal = False
+        elif char in '*?{':
+            if literal and prefix:
+                prefix.pop()
+            literal = False
+        elif char in '.^$+':
+            literal = False
+        elif literal:
+            prefix.append(char)
+
+    return ''.join(prefix)
+
+
+def _compile(pattern):
+    try:
+        return _pattern_cache[pattern]
+    except KeyError:
+        pass
+
+    if isinstance(pattern, six.string_types):
+        compiled = re.compile(pattern)
+        prefix = _literal_prefix(pattern)
+    else:
+        compiled = pattern
+        # case-insensitive and verbose patterns do not match their source text literally
+        prefix = '' if compiled.flags & (re.IGNORECASE | re.VERBOSE) else _literal_prefix(compiled.pattern)
+
+    if len(_pattern_cache) >= _MAX_CACHED_PATTERNS:
+        _pattern_cache.clear()
+
+    _pattern_cache[pattern] = (compiled, prefix)
+    return compiled, prefix
+
+
+def _undefined(id):
+    raise UnknownIdentifierError('Indentifier %s is not defined' % id)
+
+
+def _unmapped(id):
+    def unmapped(c):
+        raise ValueError('Memory-mapped parameter "{}" was unmapped when the container was closed.'.format(id))
+    return unmapped
+
+
+class _Provider(functools.partial):
+
+    def _rebind(self, func, args):
+        # partial keeps its call path in C, rebinding through __setstate__ keeps it free of checks
+        self.__setstate__((func, args, None, None))
+
 
 class MedleyContainer(object):
 
@@ -14,22 +122,60 @@ class MedleyContainer(object):
         self._raw = {}
         self._factories = set()
         self._protected = set()
+        self._scoped = set()
         self._frozen = set()
         self._keys = set()
+        self._key_versions = itertools.count()
+        self._key_version = next(self._key_versions)
+        self._sorted_keys = (self._key_version, [])
+        self._tags = {}
+        self._id_tags = {}
+        self._tag_sequence = itertools.count()
+        self._types = {}
+        self._type_cache = {}
+        self._type_versions = itertools.count()
+        self._type_version = next(self._type_versions)
+        self._declared_types = {}
+        self._observed_types = {}
+        self._primary = {}
+        self._mapped = {}
+        self._providers = {}
+        self._dependencies = {}
+        self._profile = None
+        self._lock = threading.Lock()
+        self._singleton_locks = {}
+        self._scope = contextvars.ContextVar('medley_scope', default=None) if contextvars else None
 
         for key, value in services.items():
             self.__setitem__(key, value)
 
-    def service(self, id):
+    def service(self, id, tags=None, priority=0, provides=None, primary=False, depends=None):
         def decorator(func):
-            self.__setitem__(id, func)
+            self._define(id, func, tags, priority, provides, primary, depends)
         return decorator
 
-    def create_factory(self, id):
+    def create_factory(self, id, tags=None, priority=0, provides=None, primary=False, depends=None):
         def decorator(func):
-            self.__setitem__(id, self.factory(func))
+            self._define(id, self.factory(func), tags, priority, provides, primary, depends)
         return decorator
 
+    def create_scoped(self, id, tags=None, priority=0, provides=None, primary=False, depends=None):
+        def decorator(func):
+            self._define(id, self.scoped(func), tags, priority, provides, primary, depends)
+        return decorator
+
+    def _define(self, id, func, tags, priority, provides, primary, depends):
+        self.__setitem__(id, func)
+
+        if depends:
+            self._dependencies[id] = list(depends)
+
+        if tags:
+            self.tag(id, tags, priority)
+
+        if provides:
+            self.provide(id, provides, primary)
+
     def extends(self, id):
         def decorator(func):
             self.extend(id, func)
@@ -37,7 +183,7 @@ class MedleyContainer(object):
 
     def match(self, regex):
         matches = set()
-        compiled = re.compile(regex)
+        compiled = _compile(regex)[0]
 
         for key in self._keys:
             if compiled.match(key):
@@ -45,6 +191,174 @@ class MedleyContainer(object):
 
         return matches
 
+    def iter_match(self, pattern):
+        compiled, prefix = _compile(pattern)
+        keys = self._sorted_string_keys()
+        index = bisect_left(keys, prefix) if prefix else 0
+        candidates = []
+
+        # collect the keys up front so services defined while resolving do not shift the scan
+        while index < len(keys) and keys[index].startswith(prefix):
+            if compiled.match(keys[index]):
+                candidates.append(keys[index])
+            index += 1
+
+        for key in candidates:
+            if key in self._keys:
+                yield key, self.__getitem__(key)
+
+    def _sorted_string_keys(self):
+        # sorted lazily: keeping the index sorted on every __setitem__ made bulk registration quadratic
+        version = self._key_version
+        cached_version, keys = self._sorted_keys
+
+        if cached_version != version:
+            keys = sorted(key for key in list(self._keys) if isinstance(key, six.string_types))
+            self._sorted_keys = (version, keys)
+
+        return keys
+
+    def tag(self, id, tags, priority=0):
+        if id not in self._keys:
+            raise UnknownIdentifierError('Identifier "{}" is not defined.'.format(id))
+
+        if isinstance(tags, six.string_types):
+            tags = [tags]
+
+        id_tags = self._id_tags.setdefault(id, {})
+
+        for tag in tags:
+            self._untag(id, tag)
+
+            # higher priorities sort first, ties keep their tagging order
+            entry = (-priority, next(self._tag_sequence), id)
+            insort(self._tags.setdefault(tag, []), entry)
+            id_tags[tag] = entry
+
+        return self
+
+    def tagged_keys(self, tag):
+        return [entry[2] for entry in self._tags.get(tag, ())]
+
+    def tagged(self, tag):
+        return [self.__getitem__(id) for id in self.tagged_keys(tag)]
+
+    def _untag(self, id, tag):
+        entry = self._id_tags.get(id, {}).pop(tag, None)
+
+        if entry is None:
+            return
+
+        entries = self._tags[tag]
+        del entries[bisect_left(entries, entry)]
+
+        if not entries:
+            del self._tags[tag]
+
+    def provide(self, id, types, primary=False):
+        if id not in self._keys:
+            raise UnknownIdentifierError('Identifier "{}" is not defined.'.format(id))
+
+        if isinstance(types, type):
+            types = [types]
+
+        declared = self._declared_types.setdefault(id, [])
+
+        for cls in types:
+            if cls not in declared:
+                declared.append(cls)
+                self._index_type(id, cls)
+
+            if primary:
+                self._primary[cls] = id
+
+        return self
+
+    def type_keys(self, cls):
+        # read the version before scanning, a result computed while another thread indexes is never reused
+        version = self._type_version
+        cached = self._type_cache.get(cls)
+
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+
+        # virtual subclasses (abc.register) are not in any __mro__, so the full issubclass
+        # union is computed once per type and cached until the index changes
+        ids = dict(self._types.get(cls, {}))
+
+        for indexed, indexed_ids in list(self._types.items()):
+            if issubclass(indexed, cls):
+                ids.update(indexed_ids)
+
+        self._type_cache[cls] = (version, ids)
+        return list(ids)
+
+    def get(self, id):
+        # classes may be identifiers too, those are looked up as such before the type index
+        if not isinstance(id, type) or id in self._keys:
+            return self.__getitem__(id)
+
+        if id in self._primary:
+            return self.__getitem__(self._primary[id])
+
+        ids = self.type_keys(id)
+
+        if len(ids) == 1:
+            return self.__getitem__(ids[0])
+
+        if not ids:
+            raise UnknownIdentifierError('No service is registered for type {}'.format(id.__name__))
+
+        raise AmbiguousIdentifierError('Type {} is provided by {}, mark one as primary'.format(
+            id.__name__, ', '.join(sorted(str(key) for key in ids))))
+
+    def get_all(self, cls):
+        return [self.__getitem__(id) for id in self.type_keys(cls)]
+
+    def _index_type(self, id, cls):
+        for base in cls.__mro__:
+            if base is not object:
+                ids = self._types.setdefault(base, {})
+                ids[id] = ids.get(id, 0) + 1
+
+        self._type_version = next(self._type_versions)
+        self._type_cache.clear()
+
+    def _unindex_type(self, id, cls):
+        for base in cls.__mro__:
+            ids = self._types.get(base)
+
+            if ids is None or id not in ids:
+                continue
+
+            ids[id] -= 1
+
+            if not ids[id]:
+                del ids[id]
+
+            if not ids:
+                del self._types[base]
+
+        self._type_version = next(self._type_versions)
+        self._type_cache.clear()
+
+    def _observe(self, id, value):
+        if id not in self._observed_types:
+            cls = type(value)
+            self._observed_types[id] = cls
+            self._index_type(id, cls)
+
+            if id in self._providers:
+                self._bind_provider(id)
+
+        return value
+
+    def _forget_observed(self, id):
+        cls = self._observed_types.pop(id, None)
+
+        if cls is not None:
+            self._unindex_type(id, cls)
+
     def factory(self, func):
         if not callable(func):
             raise ValueError('Service definition is not a function or callable object.')
@@ -52,6 +366,19 @@ class MedleyContainer(object):
         self._factories.add(func)
         return func
 
+    def scoped(self, func):
+        if not callable(func):
+            raise ValueError('Service definition is not a function or callable object.')
+
+        self._scoped.add(func)
+        return func
+
+    def enter_scope(self):
+        if self._scope is None:
+            raise ScopeError('Scopes require contextvars (Python 3.7+).')
+
+        return Scope(self._scope)
+
     def protect(self, func):
         if not callable(func):
             raise ValueError('Callable is not a function or callable object.')
@@ -59,6 +386,112 @@ class MedleyContainer(object):
         self._protected.add(func)
         return func
 
+    def mmap_param(self, id, path, dtype=None):
+        if dtype is not None:
+            check_format(dtype)
+
+        def mapped(c):
+            mapping = MappedFile(path, dtype)
+            view = mapping.open()
+            c._mapped[id] = mapping
+
+            return view
+
+        self.__setitem__(id, mapped)
+        return mapped
+
+    def close(self):
+        mapped, self._mapped = self._mapped, {}
+
+        for id, mapping in mapped.items():
+            mapping.close()
+
+            # the view handed out is released, fail loudly instead of returning it again
+            if id in self._raw:
+                del self._raw[id]
+                self._frozen.discard(id)
+                self._values[id] = _unmapped(id)
+                self._forget_observed(id)
+
+                if id in self._providers:
+                    self._bind_provider(id)
+
+    def provider(self, id):
+        if id not in self._keys:
+            raise UnknownIdentifierError('Identifier "{}" is not defined.'.format(id))
+
+        if id not in self._providers:
+            self._providers[id] = _Provider(_undefined, id)
+            self._bind_provider(id)
+
+        return self._providers[id]
+
+    def _bind_provider(self, id):
+        provider = self._providers[id]
+
+        if id not in self._keys:
+            return provider._rebind(_undefined, (id, ))
+
+        if self._profile is not None:
+            return provider._rebind(self.__getitem__, (id, ))
+
+        if not self._is_definition(id):
+            return provider._rebind(self._values.__getitem__, (id, ))
+
+        # factories are bound directly once their first instance has been observed
+        if self._values[id] in self._factories and id in self._observed_types:
+            return provider._rebind(self._values[id], (self, ))
+
+        provider._rebind(self.__getitem__, (id, ))
+
+    def record_profile(self, path=None):
+        if self._profile is None:
+            self._profile = AccessProfile()
+
+            # providers skip __getitem__, route them through it while recording
+            for id in self._providers:
+                self._bind_provider(id)
+
+        if path is not None:
+            atexit.register(self.save_profile, path)
+
+        return self
+
+    def save_profile(self, path):
+        if self._profile is None:
+            raise ValueError('Access profiling is not enabled, call record_profile() first.')
+
+        self._profile.save(path)
+
+    def warm_from_profile(self, path, limit=None, min_count=2, background=True):
+        try:
+            profile = AccessProfile.load(path)
+        except (IOError, OSError) as e:
+            # there is no profile on first boot, everything simply stays lazy
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+        ids = profile.ranked(min_count, limit, lambda id: id in self._keys and self._is_singleton(id))
+
+        def warm():
+            for id in ids:
+                try:
+                    if id in self._keys and self._is_singleton(id):
+                        self.__getitem__(id)
+                except Exception:
+                    # leave the failure to the request path, where it is raised to the caller
+                    pass
+
+        thread = threading.Thread(target=warm, name='medley-warm-up')
+        thread.daemon = True
+        thread.start()
+
+        if not background:
+            thread.join()
+
+        return thread
+
     def raw(self, id):
         if id not in self._keys:
             raise UnknownIdentifierError('Identifier "{}" is not defined.'.format(id))
@@ -87,9 +520,42 @@ class MedleyContainer(object):
             self._factories.remove(factory)
             self._factories.add(extended)
 
+        if factory in self._scoped:
+            self._scoped.remove(factory)
+            self._scoped.add(extended)
+
         self.__setitem__(id, extended)
         return extended
 
+    def copy(self):
+        container = type(self)()
+        values = dict(self._values)
+        raw = dict(self._raw)
+
+        # built singletons are copied as their definitions, the copy builds its own instances
+        for id, value in values.items():
+            container.__setitem__(id, raw.get(id, value))
+
+        container._factories = set(self._factories)
+        container._protected = set(self._protected)
+        container._scoped = set(self._scoped)
+        container._dependencies = dict((id, list(ids)) for id, ids in self._dependencies.items())
+
+        # share the access profile, so recording (and its atexit save) carries over to the copy
+        container._profile = self._profile
+
+        for tag, entries in list(self._tags.items()):
+            for order, _, id in entries:
+                container.tag(id, [tag], -order)
+
+        for id, types in list(self._declared_types.items()):
+            container.provide(id, types)
+
+        for cls, id in list(self._primary.items()):
+            container.provide(id, [cls], primary=True)
+
+        return container
+
     def keys(self):
         return self._values.keys()
 
@@ -107,11 +573,25 @@ class MedleyContainer(object):
 
         self._values[id] = value
         self._keys.add(id)
+        self._key_version = next(self._key_versions)
+        self._forget_observed(id)
+
+        # parameters are never resolved, index their type as soon as they are set
+        if (not isinstance(value, Hashable)
+                or isinstance(value, bytearray)  # Python 2.7 Fix
+                or not callable(value)):
+            self._observe(id, value)
+
+        if id in self._providers:
+            self._bind_provider(id)
 
     def __getitem__(self, id):
         if id not in self._keys:
             raise UnknownIdentifierError('Indentifier %s is not defined' % id)
 
+        if self._profile is not None:
+            self._profile.access(id)
+
         if (id in self._raw
                 or not isinstance(self._values[id], Hashable)
                 or isinstance(self._values[id], bytearray)  # Python 2.7 Fix
@@ -120,16 +600,74 @@ class MedleyContainer(object):
             return self._values[id]
 
         if self._values[id] in self._factories:
-            return self._values[id](self)
+            if self._profile is not None:
+                return self._observe(id, self._profile.build(id, self._values[id], self))
+
+            if id in self._observed_types:
+                return self._values[id](self)
+
+            return self._observe(id, self._values[id](self))
 
-        raw = self._values[id]
-        val = raw(self)
+        if self._values[id] in self._scoped:
+            return self._get_scoped(id)
 
+        # singletons are built once, even when several threads ask for them at the same time
+        with self._singleton_lock(id):
+            if id in self._raw:
+                return self._values[id]
+
+            raw = self._values[id]
+            val = raw(self) if self._profile is None else self._profile.build(id, raw, self)
+            self._freeze(id, raw, val)
+
+        return val
+
+    def resolve(self, id):
+        return resolve(self, id)
+
+    def _is_definition(self, id):
+        value = self._values[id]
+
+        return not (id in self._raw
+                    or not isinstance(value, Hashable)
+                    or isinstance(value, bytearray)  # Python 2.7 Fix
+                    or value in self._protected
+                    or not callable(value))
+
+    def _is_factory(self, id):
+        return self._is_definition(id) and self._values[id] in self._factories
+
+    def _is_singleton(self, id):
+        return (self._is_definition(id)
+                and self._values[id] not in self._factories
+                and self._values[id] not in self._scoped)
+
+    def _singleton_lock(self, id):
+        # one lock per identifier, so a slow build never holds up unrelated ones
+        with self._lock:
+            try:
+                return self._singleton_locks[id]
+            except KeyError:
+                lock = self._singleton_locks[id] = threading.RLock()
+                return lock
+
+    def _freeze(self, id, raw, val):
         self._values[id] = val
         self._raw[id] = raw
         self._frozen.add(id)
+        self._observe(id, val)
 
-        return val
+    def _get_scoped(self, id):
+        scope = self._scope.get() if self._scope is not None else None
+
+        if scope is None:
+            raise ScopeError('Identifier "{}" is scoped and no scope is active.'.format(id))
+
+        try:
+            return scope.instances[id]
+        except KeyError:
+            instance = scope.instances[id] = self._values[id](self)
+            return self._observe(id, instance)
 
     def __delitem__(self, id):
         if id in self._keys:
@@ -137,14 +675,37 @@ class MedleyContainer(object):
                 if callable(self._values[id]):
                     self._factories.discard(self._values[id])
                     self._protected.discard(self._values[id])
+                    self._scoped.discard(self._values[id])
 
                 del self._values[id]
 
             if id in self._raw:
                 del self._raw[id]
 
+            for tag in list(self._id_tags.get(id, ())):
+                self._untag(id, tag)
+
+            self._id_tags.pop(id, None)
+            self._dependencies.pop(id, None)
+            self._singleton_locks.pop(id, None)
+
+            for cls in self._declared_types.pop(id, ()):
+                self._unindex_type(id, cls)
+
+            for cls in [cls for cls, primary in self._primary.items() if primary == id]:
+                del self._primary[cls]
+
+            self._forget_observed(id)
+
+            if id in self._mapped:
+                self._mapped.pop(id).close()
+
+            if id in self._providers:
+                self._providers[id]._rebind(_undefined, (id, ))
+
             self._frozen.discard(id)
             self._keys.discard(id)
+            self._key_version = next(self._key_versions)
 
     def __contains__(self, id):
         return id in self._keys
@@ -1,6 +1,25 @@
+class AmbiguousIdentifierError(ValueError):
+    pass
+
+
 class FrozenServiceError(ValueError):
     pass
 
 
 class UnknownIdentifierError(ValueError):
     pass
+
+
+class ScopeError(ValueError):
+    pass
+
+
+class ResolutionError(ValueError):
+
+    def __init__(self, message, path=()):
+        ValueError.__init__(self, message)
+        self.path = list(path)
+
+
+class CircularDependencyError(ResolutionError):
+    pass
@@ -0,0 +1,135 @@
+import threading
+from .container import MedleyContainer
+
+
+class Generation(object):
+
+    def __init__(self, container, version, generations=None):
+        self.container = container
+        self.version = version
+        self.retired = False
+        self._generations = generations
+
+        # list.append() and list.pop() are atomic, so pinning a generation never takes a lock
+        self._pins = []
+        self._disposal = [True]
+
+    def pin(self):
+        self._pins.append(None)
+
+    def unpin(self):
+        self._pins.pop()
+
+        if self.retired and not self._pins:
+            self._dispose()
+
+    def retire(self):
+        self.retired = True
+
+        if not self._pins:
+            self._dispose()
+
+    def _dispose(self):
+        # both the last reader and retire() may get here, only the first one to claim it disposes
+        try:
+            self._disposal.pop()
+        except IndexError:
+            return
+
+        container = self.container
+
+        # parameters are shared between generations by copy(), and a singleton may simply return one,
+        # so only close objects that neither this container's parameters nor the live generation hold
+        shared = set(id(value) for key, value in list(container._values.items()) if key not in container._raw)
+
+        if self._generations is not None and self._generations._current.container is not container:
+            shared.update(id(value) for value in list(self._generations._current.container._values.values()))
+
+        for key in reversed(list(container._raw)):
+            value = container._values.get(key)
+
+            if id(value) in shared:
+                continue
+
+            # a service returned under several identifiers is closed once
+            shared.add(id(value))
+            close = getattr(value, 'close', None)
+
+            if callable(close):
+                close()
+
+        container.close()
+
+
+class _Lease(object):
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.container = generation.container
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.generation.unpin()
+
+    def __enter__(self):
+        return self.container
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class GenerationalContainer(object):
+
+    def __init__(self, container=None):
+        self._current = Generation(container if container is not None else MedleyContainer(), 0, self)
+        # writers only: serializes reloads so none of them starts from a generation about to be replaced
+        self._swap_lock = threading.RLock()
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def acquire(self):
+        while True:
+            generation = self._current
+            generation.pin()
+
+            if not generation.retired:
+                return _Lease(generation)
+
+            # swapped out between reading _current and pinning it, try the new one
+            generation.unpin()
+
+    def prepare(self, configure=None):
+        container = self._current.container.copy()
+
+        if configure is not None:
+            configure(container)
+
+        return container
+
+    def swap(self, container, warm=None):
+        if warm is None:
+            warm = list(self._current.container._raw)
+
+        try:
+            for id in warm:
+                if id in container:
+                    container[id]
+        except Exception:
+            # the abandoned container was never published, release what it managed to build
+            Generation(container, None, self).retire()
+            raise
+
+        with self._swap_lock:
+            retired = self._current
+            self._current = Generation(container, retired.version + 1, self)
+
+        retired.retire()
+        return self._current.version
+
+    def reload(self, configure=None, warm=None):
+        with self._swap_lock:
+            return self.swap(self.prepare(configure), warm)
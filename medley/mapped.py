@@ -0,0 +1,65 @@
+import mmap
+import os
+import six
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# struct format codes that memoryview.cast() and numpy.dtype() read the same way
+FORMATS = frozenset('bBhHiIlLqQefd?')
+
+
+def check_format(dtype):
+    if (not isinstance(dtype, six.string_types)
+            or (dtype[1:] if dtype.startswith('@') else dtype) not in FORMATS):
+        raise ValueError('dtype "{}" is not a struct format code such as "f" or "i".'.format(dtype))
+
+
+class MappedFile(object):
+
+    def __init__(self, path, dtype=None):
+        self.path = path
+        self.dtype = dtype
+        self.view = None
+        self._mmap = None
+
+    def open(self):
+        with open(self.path, 'rb') as fh:
+            # mmap refuses empty files, they are exposed as an empty buffer instead
+            if os.fstat(fh.fileno()).st_size:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = self._mmap if self._mmap is not None else b''
+
+        try:
+            if self.dtype is None:
+                self.view = memoryview(buffer)
+            elif numpy is not None:
+                self.view = numpy.frombuffer(buffer, dtype=self.dtype)
+            else:
+                with memoryview(buffer) as raw:
+                    self.view = raw.cast(self.dtype)
+        except (TypeError, ValueError) as e:
+            # the caller never gets a handle to this mapping, unmap it here
+            self.close()
+            six.raise_from(ValueError('Cannot map "{}" as dtype "{}": {}'.format(self.path, self.dtype, e)), e)
+
+        return self.view
+
+    def close(self):
+        view, self.view = self.view, None
+
+        if isinstance(view, memoryview):
+            view.release()
+
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # something still exports the buffer (e.g. an array view), the
+                # pages are unmapped once the last reference is dropped
+                pass
+
+            self._mmap = None
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import time
+import six
+
+try:
+    perf_counter = time.perf_counter
+except AttributeError:
+    perf_counter = time.time
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class AccessProfile(object):
+
+    def __init__(self, services=None):
+        # id -> [accesses, builds, seconds spent building]
+        self.services = services if services is not None else {}
+
+    def access(self, id):
+        try:
+            self.services[id][0] += 1
+        except KeyError:
+            self.services.setdefault(id, [0, 0, 0.0])[0] += 1
+
+    def build(self, id, func, c):
+        start = perf_counter()
+        value = func(c)
+
+        # only completed builds count, aborted attempts (e.g. by resolve()) are retried later
+        stats = self.services.setdefault(id, [0, 0, 0.0])
+        stats[1] += 1
+        stats[2] += perf_counter() - start
+
+        return value
+
+    def ranked(self, min_count=2, limit=None, warmable=None):
+        scores = []
+
+        # filter before ranking so ids that cannot be warmed (e.g. hot factories) never take up the limit
+        for id, (accesses, builds, build_time) in self.services.items():
+            if accesses < min_count or not builds or (warmable is not None and not warmable(id)):
+                continue
+
+            # a warmed service saves one build on the request path, weighted by how hot it is
+            scores.append((build_time / builds * accesses, id))
+
+        scores.sort(key=lambda score: score[0], reverse=True)
+        return [id for _, id in scores[:limit]]
+
+    def save(self, path):
+        services = dict(
+            (id, {'accesses': accesses, 'builds': builds, 'build_time': build_time})
+            for id, (accesses, builds, build_time) in list(self.services.items())
+            if isinstance(id, six.string_types)
+        )
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.medley-profile-')
+
+        # write next to the target and rename so concurrent readers never see a partial file
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({'version': 1, 'services': services}, fh, indent=2, sort_keys=True)
+
+            _replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fh:
+            data = json.load(fh)
+
+        return cls(dict(
+            (id, [stats['accesses'], stats['builds'], stats['build_time']])
+            for id, stats in data.get('services', {}).items()
+        ))
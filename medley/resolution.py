@@ -0,0 +1,133 @@
+import six
+from .errors import CircularDependencyError, ResolutionError, UnknownIdentifierError
+
+
+class _Unresolved(BaseException):
+    # BaseException so that broad "except Exception" blocks in definitions do not swallow it
+
+    def __init__(self, id):
+        BaseException.__init__(self, id)
+        self.id = id
+
+
+class _ResolvingView(object):
+
+    def __init__(self, container):
+        self._container = container
+        self._active = True
+
+    def __getitem__(self, id):
+        container = self._container
+
+        if not self._active or id not in container:
+            return container[id]
+
+        if container._is_singleton(id):
+            raise _Unresolved(id)
+
+        if container._is_factory(id):
+            # build factories against the view so their singleton dependencies go through the engine too
+            return container.raw(id)(self)
+
+        return container[id]
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+    def __setitem__(self, id, value):
+        self._container[id] = value
+
+    def __delitem__(self, id):
+        del self._container[id]
+
+    def __contains__(self, id):
+        return id in self._container
+
+    def __len__(self):
+        return len(self._container)
+
+    def __iter__(self):
+        return iter(self._container)
+
+
+def _format_path(path):
+    return ' -> '.join('"{}"'.format(id) for id in path)
+
+
+def _build(container, view, stack, current):
+    raw = container.raw(current)
+
+    try:
+        if container._profile is None:
+            return raw(view), None
+
+        return container._profile.build(current, raw, view), None
+    except _Unresolved as e:
+        return None, e.id
+    except Exception as e:
+        six.raise_from(ResolutionError('Cannot resolve {}: {}'.format(
+            _format_path(stack), e), list(stack)), e)
+
+
+def resolve(container, id):
+    if id not in container:
+        raise UnknownIdentifierError('Identifier "{}" is not defined.'.format(id))
+
+    view = _ResolvingView(container)
+    stack = [id]
+    building = set(stack)
+
+    # a factory root runs through the work loop too, its instance is returned instead of frozen
+    factory = container._is_factory(id)
+    result = None
+
+    try:
+        while stack:
+            current = stack[-1]
+            is_root_factory = factory and len(stack) == 1
+
+            if not is_root_factory and not container._is_singleton(current):
+                stack.pop()
+                building.discard(current)
+                continue
+
+            pending = [dep for dep in container._dependencies.get(current, ())
+                       if dep in container and container._is_singleton(dep)]
+            dependency = pending[-1] if pending else None
+
+            if dependency is None and is_root_factory:
+                result, dependency = _build(container, view, stack, current)
+
+                if dependency is None:
+                    stack.pop()
+                    continue
+            elif dependency is None:
+                with container._singleton_lock(current):
+                    # another thread may have built it while we waited for the lock
+                    if not container._is_singleton(current):
+                        continue
+
+                    value, dependency = _build(container, view, stack, current)
+
+                    if dependency is None:
+                        container._freeze(current, container.raw(current), value)
+                        stack.pop()
+                        building.discard(current)
+                        continue
+
+            if dependency in building:
+                path = stack[stack.index(dependency):] + [dependency]
+                raise CircularDependencyError('Circular dependency {}'.format(_format_path(path)), path)
+
+            stack.append(dependency)
+            building.add(dependency)
+    finally:
+        view._active = False
+
+    if factory:
+        if container._profile is not None:
+            container._profile.access(id)
+
+        return container._observe(id, result)
+
+    return container[id]
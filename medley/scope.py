@@ -0,0 +1,61 @@
+class Scope(object):
+
+    def __init__(self, var):
+        self._var = var
+        self._token = None
+        self.instances = {}
+
+    def dispose(self):
+        errors = []
+
+        for instance in self._pop_instances():
+            close = getattr(instance, 'close', None)
+
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+    async def adispose(self):
+        errors = []
+
+        for instance in self._pop_instances():
+            aclose = getattr(instance, 'aclose', None)
+            close = getattr(instance, 'close', None)
+
+            try:
+                if callable(aclose):
+                    await aclose()
+                elif callable(close):
+                    close()
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise errors[0]
+
+    def _pop_instances(self):
+        # dispose in reverse creation order so dependents go before their dependencies
+        instances = list(self.instances.values())
+        self.instances.clear()
+
+        return reversed(instances)
+
+    def __enter__(self):
+        self._token = self._var.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._var.reset(self._token)
+        self.dispose()
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        self._var.reset(self._token)
+        await self.adispose()
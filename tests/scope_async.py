@@ -0,0 +1,37 @@
+import asyncio
+from medley import MedleyContainer
+
+
+class AsyncSession(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+class AsyncScopeTests(object):
+
+    def test_async_scope_per_task(self):
+        c = MedleyContainer()
+        c['session'] = c.scoped(lambda c: AsyncSession())
+
+        async def handle():
+            async with c.enter_scope():
+                session = c['session']
+                await asyncio.sleep(0)
+                self.assertIs(c['session'], session)
+
+            return session
+
+        async def main():
+            return await asyncio.gather(*[handle() for _ in range(3)])
+
+        sessions = asyncio.run(main())
+
+        self.assertEqual(len(set(map(id, sessions))), 3)
+        self.assertTrue(all(session.closed for session in sessions))
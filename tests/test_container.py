@@ -1,7 +1,18 @@
+import os
+import re
+import struct
+import tempfile
 import unittest
 import types
+from abc import ABCMeta
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 from mock import Mock, MagicMock, patch
-from medley import MedleyContainer
+from medley import AmbiguousIdentifierError, MedleyContainer, UnknownIdentifierError
+from medley.container import _literal_prefix
+from medley.mapped import MappedFile
 
 
 class MedleyContainerTest(unittest.TestCase):
@@ -639,3 +650,433 @@ class MedleyContainerTest(unittest.TestCase):
         self.assertEqual(c._raw, {})
         c._frozen.discard.assert_called_with('foo')
         c._keys.discard.assert_called_with('foo')
+
+    def test_tag_throws_error_when_service_id_does_not_exist(self):
+        c = MedleyContainer()
+
+        with self.assertRaises(Exception):
+            c.tag('foo', ['listener'])
+
+    def test_tagged_returns_services_ordered_by_priority(self):
+        c = MedleyContainer()
+        c['foo'] = self.foo
+        c['bar'] = self.bar
+        c['baz'] = self.baz
+
+        c.tag('foo', ['listener'])
+        c.tag('bar', ['listener'], priority=10)
+        c.tag('baz', 'listener')
+
+        self.assertEqual(c.tagged_keys('listener'), ['bar', 'foo', 'baz'])
+        self.assertEqual(c.tagged('listener'), ['bar', 'foo', 'baz'])
+        self.assertEqual(c.tagged('unknown'), [])
+
+    def test_tagged_allows_unhashable_services(self):
+        c = MedleyContainer()
+
+        @c.service('foo', tags=['check'])
+        def foo(c):
+            return {'name': 'foo'}
+
+        @c.create_factory('bar', tags=['check'], priority=-1)
+        def bar(c):
+            return ['bar']
+
+        self.assertEqual(c.tagged('check'), [{'name': 'foo'}, ['bar']])
+
+    def test_retagging_replaces_priority(self):
+        c = MedleyContainer()
+        c['foo'] = self.foo
+        c['bar'] = self.bar
+
+        c.tag('foo', ['listener'], priority=10)
+        c.tag('bar', ['listener'], priority=5)
+        c.tag('foo', ['listener'], priority=0)
+
+        self.assertEqual(c.tagged_keys('listener'), ['bar', 'foo'])
+
+    def test_delitem_removes_id_from_tag_index(self):
+        c = MedleyContainer()
+        c['foo'] = self.foo
+        c['bar'] = self.bar
+        c.tag('foo', ['listener', 'check'])
+        c.tag('bar', ['listener'])
+
+        del c['foo']
+
+        self.assertEqual(c.tagged_keys('listener'), ['bar'])
+        self.assertEqual(c.tagged_keys('check'), [])
+        self.assertEqual(c._tags, {'listener': c._tags['listener']})
+        self.assertEqual(c._id_tags, {'bar': c._id_tags['bar']})
+
+    def test_iter_match_yields_keys_and_services_in_key_order(self):
+        c = MedleyContainer()
+        c['event.foo'] = self.foo
+        c['event.bar'] = self.bar
+        c['events'] = self.baz
+        c['bat'] = self.bat
+
+        self.assertEqual(list(c.iter_match(r'event\.')), [('event.bar', 'bar'), ('event.foo', 'foo')])
+        self.assertEqual(list(c.iter_match('(foo|bat)')), [('bat', 'bat')])
+        self.assertEqual(list(c.iter_match('.*s$')), [('events', 'baz')])
+        self.assertEqual(list(c.iter_match('missing')), [])
+
+    def test_iter_match_resolves_services_lazily(self):
+        c = MedleyContainer()
+        c['foo.a'] = self.foo
+        c['foo.b'] = self.bar
+
+        matches = c.iter_match('foo')
+        self.assertEqual(next(matches), ('foo.a', 'foo'))
+
+        self.foo.assert_called_once_with(c)
+        self.bar.assert_not_called()
+
+    def test_iter_match_allows_unhashable_services(self):
+        c = MedleyContainer()
+        c['foo'] = lambda c: {'foo': 'bar'}
+        c['foo.list'] = ['bar']
+
+        self.assertEqual(dict(c.iter_match('foo')), {'foo': {'foo': 'bar'}, 'foo.list': ['bar']})
+
+    def test_iter_match_skips_deleted_keys(self):
+        c = MedleyContainer()
+        c['foo'] = 'foo'
+        c['foo.bar'] = 'bar'
+
+        del c['foo']
+
+        self.assertEqual(list(c.iter_match('foo')), [('foo.bar', 'bar')])
+        self.assertEqual(c._sorted_keys[1], ['foo.bar'])
+
+        c['foo.baz'] = 'baz'
+        self.assertEqual(list(c.iter_match('foo')), [('foo.bar', 'bar'), ('foo.baz', 'baz')])
+
+    def test_iter_match_accepts_compiled_patterns(self):
+        c = MedleyContainer()
+        c['Foo'] = 'foo'
+        c['bar'] = 'bar'
+
+        self.assertEqual(list(c.iter_match(re.compile('foo', re.IGNORECASE))), [('Foo', 'foo')])
+
+    def test_iter_match_ignores_source_prefix_of_verbose_patterns(self):
+        c = MedleyContainer()
+        c['ab'] = 'ab'
+
+        pattern = re.compile('a b', re.VERBOSE)
+
+        self.assertEqual(c.match(pattern), set(['ab']))
+        self.assertEqual(list(c.iter_match(pattern)), [('ab', 'ab')])
+
+    def test_literal_prefix_is_only_used_when_every_match_shares_it(self):
+        self.assertEqual(_literal_prefix('foo.bar'), 'foo')
+        self.assertEqual(_literal_prefix(r'foo\.bar'), 'foo.bar')
+        self.assertEqual(_literal_prefix('^foo+'), 'foo')
+        self.assertEqual(_literal_prefix('foo?'), 'fo')
+        self.assertEqual(_literal_prefix('foo(a|b)'), 'foo')
+        self.assertEqual(_literal_prefix('foo|bar'), '')
+        self.assertEqual(_literal_prefix('foo[](]|bar'), '')
+        self.assertEqual(_literal_prefix('(?i)foo'), '')
+
+    def test_get_returns_service_by_identifier(self):
+        c = MedleyContainer()
+        c['foo'] = self.foo
+
+        self.assertEqual(c.get('foo'), 'foo')
+
+    def test_get_prefers_classes_registered_as_identifiers(self):
+        c = MedleyContainer()
+
+        class Cache(object):
+            pass
+
+        c[Cache] = lambda c: 'x'
+
+        self.assertEqual(c.get(Cache), 'x')
+
+    def test_get_returns_service_by_declared_type_and_base(self):
+        c = MedleyContainer()
+
+        class Cache(object):
+            pass
+
+        class RedisCache(Cache):
+            pass
+
+        factory = Mock(return_value=RedisCache())
+
+        @c.service('cache', provides=[RedisCache])
+        def cache(c):
+            return factory()
+
+        self.assertIs(c.get(Cache), factory.return_value)
+        self.assertIs(c.get(RedisCache), factory.return_value)
+        self.assertEqual(c.type_keys(Cache), ['cache'])
+
+    def test_get_indexes_observed_type_on_first_resolution(self):
+        c = MedleyContainer()
+
+        class Mailer(object):
+            pass
+
+        c['mailer'] = lambda c: Mailer()
+
+        with self.assertRaises(UnknownIdentifierError):
+            c.get(Mailer)
+
+        mailer = c['mailer']
+        self.assertIs(c.get(Mailer), mailer)
+
+    def test_get_handles_virtual_subclasses(self):
+        c = MedleyContainer()
+        c['settings'] = lambda c: {'debug': True}
+        c['settings']
+
+        self.assertEqual(c.get(Mapping), {'debug': True})
+        self.assertIn(Mapping, c._type_cache)
+
+        del c['settings']
+        self.assertEqual(c.type_keys(Mapping), [])
+
+    def test_type_keys_includes_virtual_subclasses_next_to_real_ones(self):
+        c = MedleyContainer()
+
+        Base = ABCMeta('Base', (object, ), {})
+
+        class Impl(Base):
+            pass
+
+        class Other(object):
+            pass
+
+        Base.register(Other)
+        c['impl'] = lambda c: Impl()
+        c['other'] = lambda c: Other()
+        c['impl']
+        c['other']
+
+        self.assertEqual(sorted(c.type_keys(Base)), ['impl', 'other'])
+        self.assertIn(Base, c._type_cache)
+
+    def test_type_keys_does_not_cache_results_of_a_concurrent_index_change(self):
+        c = MedleyContainer()
+        indexed = []
+
+        class Meta(ABCMeta):
+
+            def __subclasscheck__(cls, subclass):
+                # another thread resolving a service while this lookup scans the index
+                if not indexed:
+                    indexed.append(c['impl'])
+                return ABCMeta.__subclasscheck__(cls, subclass)
+
+        Cache = Meta('Cache', (object, ), {})
+        Impl = type('Impl', (Cache, ), {})
+        c['config'] = {}
+        c['impl'] = lambda c: Impl()
+
+        self.assertEqual(c.type_keys(Cache), [])
+        self.assertEqual(c.type_keys(Cache), ['impl'])
+
+    def test_get_returns_parameters_by_type(self):
+        c = MedleyContainer()
+
+        class Config(object):
+            pass
+
+        config = Config()
+        c['config'] = config
+
+        self.assertIs(c.get(Config), config)
+
+        c['config'] = 'config'
+        self.assertEqual(c.type_keys(Config), [])
+
+    def test_get_throws_error_when_type_is_ambiguous(self):
+        c = MedleyContainer()
+
+        class Cache(object):
+            pass
+
+        c['foo'] = lambda c: Cache()
+        c['bar'] = lambda c: Cache()
+        c.provide('foo', Cache)
+        c.provide('bar', Cache)
+
+        with self.assertRaises(AmbiguousIdentifierError):
+            c.get(Cache)
+
+        self.assertEqual(len(c.get_all(Cache)), 2)
+
+        c.provide('bar', Cache, primary=True)
+        self.assertIs(c.get(Cache), c['bar'])
+
+        del c['bar']
+        self.assertIs(c.get(Cache), c['foo'])
+        self.assertEqual(c._primary, {})
+
+    def test_override_forgets_observed_type(self):
+        c = MedleyContainer()
+        c['foo'] = c.factory(lambda c: 'foo')
+        c['foo']
+
+        self.assertEqual(c.type_keys(str), ['foo'])
+
+        c['foo'] = c.factory(lambda c: 10)
+        self.assertEqual(c.type_keys(str), [])
+
+        c['foo']
+        self.assertEqual(c.type_keys(int), ['foo'])
+
+    def test_delitem_removes_id_from_type_index(self):
+        c = MedleyContainer()
+
+        class Cache(object):
+            pass
+
+        c['foo'] = lambda c: Cache()
+        c.provide('foo', [Cache])
+        c['foo']
+
+        del c['foo']
+
+        self.assertEqual(c._types, {})
+        self.assertEqual(c._declared_types, {})
+        self.assertEqual(c._observed_types, {})
+
+    def write_blob(self, data):
+        fh = tempfile.NamedTemporaryFile(delete=False)
+        fh.write(data)
+        fh.close()
+        self.addCleanup(os.remove, fh.name)
+
+        return fh.name
+
+    def test_mmap_param_maps_file_lazily(self):
+        c = MedleyContainer()
+        path = self.write_blob(b'embeddings')
+
+        with patch('medley.container.MappedFile', wraps=MappedFile) as mapped:
+            c.mmap_param('blob', path)
+            mapped.assert_not_called()
+
+            view = c['blob']
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(view.tobytes(), b'embeddings')
+            self.assertIs(c['blob'], view)
+            mapped.assert_called_once_with(path, None)
+
+    def test_mmap_param_casts_to_dtype(self):
+        c = MedleyContainer()
+        path = self.write_blob(struct.pack('3i', 1, 2, 3))
+        c.mmap_param('table', path, dtype='i')
+
+        self.assertEqual(list(c['table']), [1, 2, 3])
+
+    def test_mmap_param_throws_error_for_non_struct_dtype(self):
+        c = MedleyContainer()
+
+        with self.assertRaises(ValueError):
+            c.mmap_param('table', self.write_blob(b''), dtype='float32')
+
+        self.assertNotIn('table', c)
+
+    def test_mmap_param_unmaps_file_that_does_not_fit_dtype(self):
+        c = MedleyContainer()
+        path = self.write_blob(b'12345')
+        mappings = []
+
+        def track(*args):
+            mappings.append(MappedFile(*args))
+            return mappings[-1]
+
+        with patch('medley.container.MappedFile', side_effect=track):
+            c.mmap_param('table', path, dtype='i')
+
+            with self.assertRaises(ValueError) as cm:
+                c['table']
+
+        self.assertIn(path, str(cm.exception))
+        self.assertIsNone(mappings[0]._mmap)
+        self.assertEqual(c._mapped, {})
+
+    def test_mmap_param_allows_empty_files(self):
+        c = MedleyContainer()
+        c.mmap_param('empty', self.write_blob(b''))
+
+        self.assertEqual(len(c['empty']), 0)
+
+    def test_delitem_unmaps_mmap_param(self):
+        c = MedleyContainer()
+        c.mmap_param('blob', self.write_blob(b'blob'))
+        view = c['blob']
+        mapping = c._mapped['blob']
+
+        del c['blob']
+
+        self.assertEqual(c._mapped, {})
+        self.assertIsNone(mapping._mmap)
+        with self.assertRaises(ValueError):
+            view.tobytes()
+
+    def test_close_unmaps_every_mmap_param(self):
+        c = MedleyContainer()
+        c.mmap_param('foo', self.write_blob(b'foo'))
+        c.mmap_param('bar', self.write_blob(b'bar'))
+        c['foo']
+        c['bar']
+
+        c.close()
+
+        self.assertEqual(c._mapped, {})
+
+        with self.assertRaises(ValueError):
+            c['foo']
+
+    def test_provider_throws_error_when_service_id_does_not_exist(self):
+        c = MedleyContainer()
+
+        with self.assertRaises(UnknownIdentifierError):
+            c.provider('foo')
+
+    def test_provider_binds_factory_after_first_instance(self):
+        c = MedleyContainer()
+        c['foo'] = c.factory(self.foo)
+
+        provider = c.provider('foo')
+        self.assertIs(c.provider('foo'), provider)
+        self.assertEqual(provider(), 'foo')
+
+        self.assertIs(provider.func, self.foo)
+        self.assertEqual(provider.args, (c, ))
+        self.assertEqual(provider(), 'foo')
+        self.assertEqual(self.foo.call_count, 2)
+
+    def test_provider_returns_singletons_and_parameters(self):
+        c = MedleyContainer()
+        c['foo'] = lambda c: object()
+        c['bar'] = 'bar'
+
+        foo = c.provider('foo')
+        self.assertIs(foo(), c['foo'])
+        self.assertIs(foo(), foo())
+        self.assertEqual(c.provider('bar')(), 'bar')
+
+    def test_provider_is_rebound_when_definition_changes(self):
+        c = MedleyContainer()
+        c['foo'] = c.factory(self.foo)
+        provider = c.provider('foo')
+        provider()
+
+        c['foo'] = c.factory(self.bar)
+        self.assertEqual(provider(), 'bar')
+
+        c.extend('foo', lambda bar, c: bar + 'baz')
+        self.assertEqual(provider(), 'barbaz')
+
+        del c['foo']
+        with self.assertRaises(UnknownIdentifierError):
+            provider()
+
+        c['foo'] = 'foo'
+        self.assertEqual(provider(), 'foo')
@@ -0,0 +1,215 @@
+import threading
+import unittest
+from mock import Mock
+from medley import GenerationalContainer, MedleyContainer
+
+
+class Connection(object):
+
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class CopyTest(unittest.TestCase):
+
+    def test_copy_keeps_definitions_but_not_instances(self):
+        c = MedleyContainer()
+        c['url'] = 'sqlite://'
+        c['db'] = lambda c: Connection(c['url'])
+        c['request'] = c.factory(lambda c: object())
+        c['cls'] = c.protect(Connection)
+        c['db']
+
+        copy = c.copy()
+
+        self.assertNotIn('db', copy._frozen)
+        self.assertIsNot(copy['db'], c['db'])
+        self.assertIs(copy.raw('db'), c.raw('db'))
+        self.assertIsNot(copy['request'], copy['request'])
+        self.assertIs(copy['cls'], Connection)
+
+        copy['url'] = 'postgres://'
+        self.assertEqual(c['url'], 'sqlite://')
+
+    def test_copy_keeps_tags_types_and_dependencies(self):
+        c = MedleyContainer()
+
+        @c.service('foo', tags=['listener'], priority=5, provides=[Connection], primary=True, depends=['bar'])
+        def foo(c):
+            return Connection('foo')
+
+        @c.service('bar', tags=['listener'], priority=10)
+        def bar(c):
+            return Connection('bar')
+
+        copy = c.copy()
+
+        self.assertEqual(copy.tagged_keys('listener'), ['bar', 'foo'])
+        self.assertEqual(copy.get(Connection).url, 'foo')
+        self.assertEqual(copy._dependencies, {'foo': ['bar']})
+
+
+class GenerationalContainerTest(unittest.TestCase):
+
+    def setUp(self):
+        container = MedleyContainer()
+        container['url'] = 'sqlite://'
+        container['db'] = lambda c: Connection(c['url'])
+        self.generations = GenerationalContainer(container)
+
+    def test_acquire_returns_current_container(self):
+        with self.generations.acquire() as c:
+            self.assertEqual(c['db'].url, 'sqlite://')
+
+        self.assertEqual(self.generations.version, 0)
+
+    def test_reload_swaps_in_a_warmed_generation(self):
+        with self.generations.acquire() as c:
+            old = c['db']
+
+        def configure(c):
+            c['url'] = 'postgres://'
+
+        self.assertEqual(self.generations.reload(configure), 1)
+
+        with self.generations.acquire() as c:
+            self.assertIn('db', c._frozen)
+            self.assertEqual(c['db'].url, 'postgres://')
+
+        self.assertTrue(old.closed)
+
+    def test_old_generation_is_disposed_after_last_release(self):
+        lease = self.generations.acquire()
+        old = lease.container['db']
+
+        self.generations.reload(lambda c: None)
+
+        self.assertFalse(old.closed)
+        self.assertIs(lease.container['db'], old)
+
+        lease.release()
+        lease.release()
+        self.assertTrue(old.closed)
+
+    def test_concurrent_reloads_build_on_each_other(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow(c):
+            entered.set()
+            release.wait(5)
+            c['k1'] = 1
+
+        first = threading.Thread(target=lambda: self.generations.reload(slow))
+        first.start()
+        self.assertTrue(entered.wait(5))
+
+        second = threading.Thread(target=lambda: self.generations.reload(lambda c: c.__setitem__('k2', 2)))
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(self.generations.version, 2)
+
+        with self.generations.acquire() as c:
+            self.assertEqual((c['k1'], c['k2']), (1, 2))
+
+    def test_disposal_skips_objects_shared_with_other_generations(self):
+        shared = Connection('shared')
+        passed = Connection('passed')
+
+        with self.generations.acquire() as c:
+            c['pool'] = shared
+            c['svc'] = lambda c: c['pool']
+            c['svc']
+
+        self.generations.reload(lambda c: None)
+
+        with self.generations.acquire() as c:
+            self.assertIs(c['svc'], shared)
+            c['passed'] = lambda c: passed
+            c['passed']
+
+        self.generations.reload(lambda c: c.__setitem__('passed', lambda c: passed))
+
+        self.assertFalse(shared.closed)
+        self.assertFalse(passed.closed)
+
+    def test_reload_keeps_recording_into_the_same_profile(self):
+        with self.generations.acquire() as c:
+            c.record_profile()
+            profile = c._profile
+            c['db']
+
+        self.generations.reload(lambda c: None, warm=[])
+
+        with self.generations.acquire() as c:
+            self.assertIs(c._profile, profile)
+            c['db']
+
+        self.assertEqual(profile.services['db'][:2], [2, 2])
+
+    def test_failed_warm_up_keeps_current_generation(self):
+        def configure(c):
+            c['db'] = Mock(side_effect=RuntimeError('bad config'))
+
+        with self.assertRaises(RuntimeError):
+            self.generations.reload(configure, warm=['db'])
+
+        built = []
+
+        def configure_pool(c):
+            c['pool'] = lambda c: built.append(Connection('pool')) or built[-1]
+            c['db'] = Mock(side_effect=RuntimeError('bad config'))
+
+        with self.assertRaises(RuntimeError):
+            self.generations.reload(configure_pool, warm=['pool', 'db'])
+
+        self.assertTrue(built[0].closed)
+
+        self.assertEqual(self.generations.version, 0)
+
+        with self.generations.acquire() as c:
+            self.assertEqual(c['db'].url, 'sqlite://')
+
+    def test_acquire_skips_retired_generation(self):
+        current = self.generations._current
+        replacement = MedleyContainer()
+        current.retire()
+        self.generations._current = type(current)(replacement, 1)
+
+        with self.generations.acquire() as c:
+            self.assertIs(c, replacement)
+
+        self.assertEqual(current._pins, [])
+
+    def test_readers_always_see_a_consistent_generation(self):
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                with self.generations.acquire() as c:
+                    db = c['db']
+
+                    if db.closed or db.url != c['url']:
+                        errors.append(db.url)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for version in range(50):
+            self.generations.reload(lambda c, version=version: c.__setitem__('url', 'db{}'.format(version)))
+
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.generations.version, 50)
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from mock import Mock, patch
+from medley import MedleyContainer
+from medley.profile import AccessProfile
+
+
+class AccessProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'profile.json')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_getitem_records_accesses_and_builds(self):
+        c = MedleyContainer().record_profile()
+        c['foo'] = lambda c: 'foo'
+        c['bar'] = c.factory(lambda c: 'bar')
+        c['baz'] = 'baz'
+
+        for _ in range(3):
+            c['foo']
+            c['bar']
+            c['baz']
+
+        services = c._profile.services
+        self.assertEqual(services['foo'][:2], [3, 1])
+        self.assertEqual(services['bar'][:2], [3, 3])
+        self.assertEqual(services['baz'][:2], [3, 0])
+
+    def test_resolve_records_builds(self):
+        c = MedleyContainer().record_profile()
+        c['a'] = lambda c: c['b'] + 1
+        c['b'] = lambda c: 1
+
+        self.assertEqual(c.resolve('a'), 2)
+
+        services = c._profile.services
+        self.assertEqual(services['a'][:2], [1, 1])
+        self.assertEqual(services['b'][:2], [1, 1])
+        self.assertEqual(sorted(c._profile.ranked(min_count=1)), ['a', 'b'])
+
+    def test_record_profile_routes_providers_through_getitem(self):
+        c = MedleyContainer()
+        c['foo'] = c.factory(lambda c: 'foo')
+        provider = c.provider('foo')
+        provider()
+
+        c.record_profile()
+        provider()
+
+        self.assertEqual(c._profile.services['foo'][:2], [1, 1])
+
+    def test_record_profile_saves_at_exit(self):
+        with patch('medley.container.atexit') as atexit:
+            c = MedleyContainer().record_profile(self.path)
+
+        atexit.register.assert_called_once_with(c.save_profile, self.path)
+
+    def test_save_profile_throws_error_when_not_recording(self):
+        with self.assertRaises(ValueError):
+            MedleyContainer().save_profile(self.path)
+
+    def test_save_and_load_round_trip(self):
+        c = MedleyContainer().record_profile()
+        c['foo'] = lambda c: 'foo'
+        c['foo']
+        c.save_profile(self.path)
+
+        with open(self.path) as fh:
+            data = json.load(fh)
+
+        self.assertEqual(data['services']['foo']['accesses'], 1)
+        self.assertEqual(AccessProfile.load(self.path).services['foo'][:2], [1, 1])
+        self.assertEqual(os.listdir(self.directory), ['profile.json'])
+
+    def test_ranked_orders_by_value_and_skips_rare_services(self):
+        profile = AccessProfile({
+            'cheap': [100, 1, 0.001],
+            'slow': [10, 1, 1.0],
+            'rare': [1, 1, 5.0],
+            'factory': [50, 50, 0.5],
+            'param': [100, 0, 0.0]
+        })
+
+        singletons = lambda id: id != 'factory'
+
+        self.assertEqual(profile.ranked(warmable=singletons), ['slow', 'cheap'])
+        self.assertEqual(profile.ranked(limit=1, warmable=singletons), ['slow'])
+        self.assertEqual(profile.ranked(min_count=1, warmable=singletons), ['slow', 'rare', 'cheap'])
+
+    def test_ranked_filters_before_applying_the_limit(self):
+        profile = AccessProfile({
+            'factory': [200, 200, 2.0],
+            'singleton': [5, 1, 0.1]
+        })
+
+        self.assertEqual(profile.ranked(limit=1, warmable=lambda id: id != 'factory'), ['singleton'])
+
+    def test_warm_from_profile_builds_hot_singletons_only(self):
+        AccessProfile({
+            'hot': [10, 1, 0.5],
+            'cold': [1, 1, 0.5],
+            'factory': [10, 10, 0.5],
+            'broken': [10, 1, 0.5],
+            'removed': [10, 1, 0.5]
+        }).save(self.path)
+
+        c = MedleyContainer()
+        c['hot'] = Mock(return_value='hot')
+        c['cold'] = Mock(return_value='cold')
+        c['factory'] = c.factory(Mock(return_value='factory'))
+        c['broken'] = Mock(side_effect=RuntimeError)
+
+        c.warm_from_profile(self.path, background=False)
+
+        self.assertIn('hot', c._frozen)
+        self.assertNotIn('cold', c._frozen)
+        c.raw('factory').assert_not_called()
+
+    def test_warm_from_profile_limit_skips_factories(self):
+        AccessProfile({
+            'factory': [200, 200, 2.0],
+            'singleton': [5, 1, 0.1]
+        }).save(self.path)
+
+        c = MedleyContainer()
+        c['factory'] = c.factory(Mock(return_value='factory'))
+        c['singleton'] = Mock(return_value='singleton')
+
+        c.warm_from_profile(self.path, limit=1, background=False)
+
+        self.assertIn('singleton', c._frozen)
+        c.raw('factory').assert_not_called()
+
+    def test_warm_from_profile_is_a_no_op_without_profile(self):
+        c = MedleyContainer()
+        c['foo'] = Mock(return_value='foo')
+
+        self.assertIsNone(c.warm_from_profile(self.path))
+        c.raw('foo').assert_not_called()
+
+    def test_warm_from_profile_runs_in_background(self):
+        AccessProfile({'slow': [10, 1, 0.5]}).save(self.path)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(c):
+            started.set()
+            release.wait()
+            return 'slow'
+
+        c = MedleyContainer()
+        c['slow'] = slow
+
+        thread = c.warm_from_profile(self.path)
+        self.assertTrue(started.wait(5))
+        self.assertTrue(thread.daemon)
+
+        release.set()
+        self.assertEqual(c['slow'], 'slow')
+        thread.join()
+
+    def test_singletons_are_built_once_under_concurrent_access(self):
+        c = MedleyContainer()
+        build = Mock(side_effect=lambda c: time.sleep(0.01) or object())
+        c['foo'] = build
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(c['foo'])) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+
+    def test_definitions_can_wait_on_singletons_built_by_other_threads(self):
+        c = MedleyContainer()
+        c['cfg'] = lambda c: 'cfg'
+        results = []
+
+        def svc(c):
+            thread = threading.Thread(target=lambda: results.append(c['cfg']))
+            thread.start()
+            thread.join(5)
+            return results[0]
+
+        c['svc'] = svc
+
+        self.assertEqual(c['svc'], 'cfg')
+
+    def test_slow_singleton_build_does_not_block_unrelated_builds(self):
+        c = MedleyContainer()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(c):
+            started.set()
+            release.wait(5)
+            return 'slow'
+
+        c['slow'] = slow
+        c['fast'] = lambda c: 'fast'
+
+        thread = threading.Thread(target=lambda: c['slow'])
+        thread.start()
+        self.assertTrue(started.wait(5))
+
+        try:
+            self.assertEqual(c['fast'], 'fast')
+            self.assertFalse(release.is_set())
+        finally:
+            release.set()
+            thread.join()
@@ -0,0 +1,115 @@
+import sys
+import unittest
+from mock import Mock
+from medley import CircularDependencyError, MedleyContainer, ResolutionError, UnknownIdentifierError
+
+
+class ResolutionTest(unittest.TestCase):
+
+    def test_resolve_throws_error_when_service_id_does_not_exist(self):
+        c = MedleyContainer()
+
+        with self.assertRaises(UnknownIdentifierError):
+            c.resolve('foo')
+
+    def test_resolve_returns_parameters_and_resolved_services(self):
+        c = MedleyContainer()
+        c['foo'] = 'foo'
+        c['bar'] = lambda c: 'bar'
+        c['bar']
+
+        self.assertEqual(c.resolve('foo'), 'foo')
+        self.assertEqual(c.resolve('bar'), 'bar')
+
+    def test_resolve_handles_chains_deeper_than_the_recursion_limit(self):
+        c = MedleyContainer()
+        depth = sys.getrecursionlimit() * 2
+        c['service.0'] = lambda c: 0
+
+        for index in range(1, depth):
+            c['service.{}'.format(index)] = (lambda previous: lambda c: c[previous] + 1)('service.{}'.format(index - 1))
+
+        self.assertEqual(c.resolve('service.{}'.format(depth - 1)), depth - 1)
+        self.assertIn('service.0', c._frozen)
+
+    def test_resolve_builds_factory_roots_without_recursion(self):
+        c = MedleyContainer()
+        depth = sys.getrecursionlimit() * 2
+        c['service.0'] = lambda c: 0
+
+        for index in range(1, depth):
+            c['service.{}'.format(index)] = (lambda previous: lambda c: c[previous] + 1)('service.{}'.format(index - 1))
+
+        c['request'] = c.factory(lambda c: [c['service.{}'.format(depth - 1)]])
+
+        first = c.resolve('request')
+        self.assertEqual(first, [depth - 1])
+        self.assertIsNot(c.resolve('request'), first)
+        self.assertNotIn('request', c._frozen)
+
+    def test_resolve_builds_declared_dependencies_first(self):
+        c = MedleyContainer()
+        session = Mock(return_value='session')
+        storage = Mock(return_value='storage')
+
+        @c.service('session', depends=['storage'])
+        def build_session(c):
+            return session(c['storage'])
+
+        @c.service('storage')
+        def build_storage(c):
+            return storage()
+
+        self.assertEqual(c.resolve('session'), 'session')
+        session.assert_called_once_with('storage')
+        storage.assert_called_once_with()
+
+    def test_resolve_builds_factory_dependencies_against_the_engine(self):
+        c = MedleyContainer()
+        c['config'] = lambda c: {'name': 'foo'}
+        c['request'] = c.factory(lambda c: c['config']['name'])
+        c['handler'] = lambda c: c['request'] + c['request']
+
+        self.assertEqual(c.resolve('handler'), 'foofoo')
+
+    def test_resolve_reports_the_identifier_path_on_error(self):
+        c = MedleyContainer()
+        c['foo'] = lambda c: c['bar']
+        c['bar'] = lambda c: c['baz']
+        c['baz'] = Mock(side_effect=KeyError('boom'))
+
+        with self.assertRaises(ResolutionError) as context:
+            c.resolve('foo')
+
+        self.assertEqual(context.exception.path, ['foo', 'bar', 'baz'])
+        self.assertIn('"foo" -> "bar" -> "baz"', str(context.exception))
+        self.assertNotIn('foo', c._frozen)
+
+    def test_resolve_reports_missing_dependencies(self):
+        c = MedleyContainer()
+        c['foo'] = lambda c: c['missing']
+
+        with self.assertRaises(ResolutionError) as context:
+            c.resolve('foo')
+
+        self.assertEqual(context.exception.path, ['foo'])
+
+    def test_resolve_detects_circular_dependencies(self):
+        c = MedleyContainer()
+        c['foo'] = lambda c: c['bar']
+        c['bar'] = lambda c: c['baz']
+        c['baz'] = lambda c: c['bar']
+
+        with self.assertRaises(CircularDependencyError) as context:
+            c.resolve('foo')
+
+        self.assertEqual(context.exception.path, ['bar', 'baz', 'bar'])
+
+    def test_resolved_definitions_keep_a_working_container(self):
+        c = MedleyContainer()
+        c['dep'] = lambda c: 'dep'
+        c['lazy'] = lambda c: lambda: c['dep']
+
+        lazy = c.resolve('lazy')
+
+        self.assertEqual(lazy(), 'dep')
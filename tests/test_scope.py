@@ -0,0 +1,118 @@
+import sys
+import threading
+import unittest
+from mock import Mock
+from medley import MedleyContainer, ScopeError
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+# async syntax only compiles on newer interpreters, keep it out of this module
+if sys.version_info >= (3, 7):
+    from .scope_async import AsyncScopeTests
+else:
+    AsyncScopeTests = object
+
+
+class Session(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ScopeTest(unittest.TestCase):
+
+    def test_scoped_throws_error_if_arg_not_function(self):
+        c = MedleyContainer()
+
+        with self.assertRaises(Exception):
+            c.scoped('foo')
+
+    def test_getitem_throws_error_without_active_scope(self):
+        c = MedleyContainer()
+        c['session'] = c.scoped(Mock(return_value='session'))
+
+        with self.assertRaises(ScopeError):
+            c['session']
+
+    def test_delitem_removes_scoped_definition(self):
+        c = MedleyContainer()
+        definition = c.scoped(lambda c: Session())
+        c['session'] = definition
+
+        del c['session']
+
+        self.assertNotIn(definition, c._scoped)
+
+    @unittest.skipIf(contextvars is not None, 'contextvars is available')
+    def test_enter_scope_throws_error_without_contextvars(self):
+        with self.assertRaises(ScopeError):
+            MedleyContainer().enter_scope()
+
+
+@unittest.skipIf(contextvars is None, 'scopes require contextvars (Python 3.7+)')
+class ContextScopeTest(AsyncScopeTests, unittest.TestCase):
+
+    def test_scope_reuses_instance_until_exit(self):
+        c = MedleyContainer()
+
+        @c.create_scoped('session')
+        def session(c):
+            return Session()
+
+        with c.enter_scope():
+            first = c['session']
+            self.assertIs(c['session'], first)
+
+        self.assertTrue(first.closed)
+
+        with c.enter_scope():
+            self.assertIsNot(c['session'], first)
+
+    def test_nested_scope_shadows_outer_scope(self):
+        c = MedleyContainer()
+        c['session'] = c.scoped(lambda c: Session())
+
+        with c.enter_scope():
+            outer = c['session']
+
+            with c.enter_scope():
+                inner = c['session']
+
+            self.assertIsNot(inner, outer)
+            self.assertTrue(inner.closed)
+            self.assertIs(c['session'], outer)
+            self.assertFalse(outer.closed)
+
+    def test_scope_disposes_in_reverse_creation_order(self):
+        c = MedleyContainer()
+        closed = []
+        c['db'] = c.scoped(lambda c: Mock(close=lambda: closed.append('db')))
+        c['uow'] = c.scoped(lambda c: c['db'] and Mock(close=lambda: closed.append('uow')))
+
+        with c.enter_scope():
+            c['uow']
+
+        self.assertEqual(closed, ['uow', 'db'])
+
+    def test_threads_see_their_own_instances(self):
+        c = MedleyContainer()
+        c['session'] = c.scoped(lambda c: Session())
+        results = {}
+
+        def worker(name):
+            with c.enter_scope():
+                results[name] = c['session']
+
+        threads = [threading.Thread(target=worker, args=(i, )) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(map(id, results.values()))), 4)
@@ -0,0 +1,68 @@
+import argparse
+import sys
+import unittest
+from mock import patch
+
+# the harness relies on asyncio.run(), random.choices() and threading.Barrier()
+if sys.version_info >= (3, 7):
+    from benchmarks import stress
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'the stress harness requires Python 3.7+')
+class StressHarnessTest(unittest.TestCase):
+
+    def run_harness(self, *args):
+        with patch.object(stress.sys, 'stdout'):
+            return stress.main(['--workers', '2', '--iterations', '50', '--singletons', '10', '--factories', '5'] + list(args))
+
+    def test_thread_mode_reports_every_operation(self):
+        report = self.run_harness('--mode', 'threads')
+
+        self.assertEqual(report['operations_total'], 100)
+        self.assertEqual(sorted(report['operations']), sorted(stress.OPERATIONS))
+        self.assertGreaterEqual(report['singleton_builds'], report['duplicate_constructions'])
+
+    def test_asyncio_mode_is_reproducible(self):
+        first = self.run_harness('--mode', 'asyncio', '--seed', '3')
+        second = self.run_harness('--mode', 'asyncio', '--seed', '3')
+
+        self.assertEqual(
+            dict((name, operation['count']) for name, operation in first['operations'].items()),
+            dict((name, operation['count']) for name, operation in second['operations'].items())
+        )
+        self.assertEqual(first['duplicate_constructions'], 0)
+
+    def test_parse_mix_rejects_unknown_operations(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            stress.parse_mix('singleton=1,unknown=2')
+
+    def test_instrumented_lock_counts_contention(self):
+        stats = stress.LockStats()
+        lock = stress.InstrumentedLock(stress.threading.Lock(), stats)
+        acquired = stress.threading.Event()
+        release = stress.threading.Event()
+
+        def holder():
+            with lock:
+                acquired.set()
+                release.wait(5)
+
+        thread = stress.threading.Thread(target=holder)
+        thread.start()
+        self.assertTrue(acquired.wait(5))
+        self.assertFalse(lock.acquire(blocking=False))
+
+        release.set()
+        with lock:
+            pass
+        thread.join()
+
+        self.assertEqual(stats.acquisitions, 3)
+        self.assertLessEqual(stats.contended, 1)
+
+    def test_thread_mode_counts_build_lock_acquisitions(self):
+        report = self.run_harness('--mode', 'threads', '--build-delay', '0.001')
+
+        self.assertGreater(report['lock']['acquisitions'], 0)
+        self.assertLessEqual(report['lock']['contended'], report['lock']['acquisitions'])
+        self.assertEqual(report['duplicate_constructions'], 0)